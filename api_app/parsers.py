@@ -0,0 +1,16 @@
+"""
+Parser JSON basado en orjson
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+import orjson
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser de DRF deserializando con orjson"""
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {str(exc)}')
@@ -4,10 +4,39 @@ Verificación de tokens de autenticación con Firebase
 from firebase_admin import auth
 from rest_framework.response import Response
 from rest_framework import status
+from cachetools import TTLCache
+import hashlib
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Tokens ya verificados: blake2b(token) -> (decoded_token, exp)
+_TOKEN_CACHE_TTL = 60
+_token_cache = TTLCache(maxsize=4096, ttl=_TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+
+def _token_en_cache(clave):
+    """Retorna el token decodificado en caché si aún no ha expirado"""
+    with _token_cache_lock:
+        entrada = _token_cache.get(clave)
+    if entrada is None:
+        return None
+    decoded_token, exp = entrada
+    if time.time() >= exp:
+        return None
+    return decoded_token
+
+
+def _guardar_token(clave, decoded_token):
+    """Guarda un token verificado hasta su 'exp' (máximo el TTL de la caché)"""
+    exp = min(time.time() + _TOKEN_CACHE_TTL, decoded_token.get('exp', 0))
+    if exp > time.time():
+        with _token_cache_lock:
+            _token_cache[clave] = (decoded_token, exp)
+
 
 def verificar_token(request):
     """
@@ -31,11 +60,18 @@ def verificar_token(request):
         )
     
     id_token = parts[1]
+    clave = hashlib.blake2b(id_token.encode(), digest_size=16).digest()
+    
+    decoded_token = _token_en_cache(clave)
+    if decoded_token is not None:
+        request.user_firebase = decoded_token
+        return None
     
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = auth.verify_id_token(id_token, check_revoked=False)
+        _guardar_token(clave, decoded_token)
         request.user_firebase = decoded_token
-        logger.info(f"Token verificado para usuario: {decoded_token.get('email', 'N/A')}")
+        logger.info("Token verificado para usuario: %s", decoded_token.get('email', 'N/A'))
         return None
         
     except auth.InvalidIdTokenError:
@@ -57,7 +93,7 @@ def verificar_token(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
     except Exception as e:
-        logger.error(f"Error verificando token: {str(e)}")
+        logger.error("Error verificando token: %s", e)
         return Response(
             {"error": f"Error verificando token: {str(e)}"},
             status=status.HTTP_401_UNAUTHORIZED
@@ -2,14 +2,74 @@
 Servicio para reconocimiento facial con OpenCV
 """
 import cv2
+import logging
 import os
 import numpy as np
 import time
-import base64
-import re
+from cachetools import TTLCache
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from .asistencia_service import asistencia_service
 
+try:
+    # Decodificador base64 con SIMD (AVX2/SSSE3), misma API que base64
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+logger = logging.getLogger(__name__)
+
+
+def _leer_gris(img_path):
+    """Lee una imagen en escala de grises (None si no es una imagen válida)"""
+    return cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+
+
+def _cargar_imagenes(rutas):
+    """
+    Lee varias imágenes en paralelo (cv2.imread libera el GIL al decodificar)
+    
+    Args:
+        rutas: Lista de rutas de imágenes
+        
+    Returns:
+        list: Imágenes en escala de grises, None para las que no se pudieron leer
+    """
+    with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as ex:
+        return list(ex.map(_leer_gris, rutas))
+
+
+class LabelTable:
+    """
+    Tabla de etiquetas del reconocedor: names[label] -> nombre e
+    index[nombre] -> label
+    """
+    __slots__ = ('names', 'index', 'next')
+
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        self.next = len(self.names)
+
+    def add(self, name):
+        """Asigna etiqueta a un nombre si no la tiene y la retorna"""
+        if name not in self.index:
+            self.index[name] = self.next
+            self.names.append(name)
+            self.next += 1
+        return self.index[name]
+
+
+class _SesionTracker:
+    """Tracker del último rostro detectado en una sesión de cámara"""
+    __slots__ = ('tracker', 'frames', 'lock')
+
+    def __init__(self):
+        self.tracker = None
+        self.frames = 0
+        self.lock = threading.Lock()
+
 
 class ReconocimientoService:
     _instance = None
@@ -28,9 +88,12 @@ class ReconocimientoService:
         # Crear directorio Data si no existe
         os.makedirs(self.data_path, exist_ok=True)
         
-        # Clasificador de rostros
-        self.face_classif = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        # Detector de rostros DNN (ResNet-SSD); Haar como respaldo si no
+        # están los archivos del modelo. Net y CascadeClassifier no son
+        # thread-safe: cada hilo crea los suyos (ver _detector_dnn y
+        # _clasificador_haar)
+        self.usar_dnn = (
+            os.path.exists(settings.FACE_DNN_PROTOTXT) and os.path.exists(settings.FACE_DNN_MODEL)
         )
         
         # Reconocedor facial
@@ -39,63 +102,247 @@ class ReconocimientoService:
         # Cargar modelo si existe
         if os.path.exists(self.model_path):
             self.face_recognizer.read(str(self.model_path))
-            self.image_paths = os.listdir(self.data_path)
-            self.label_dict = {name: idx for idx, name in enumerate(self.image_paths)}
-            self.next_label = len(self.image_paths)
+            self.labels = LabelTable(os.listdir(self.data_path))
         else:
-            self.image_paths = []
-            self.label_dict = {}
-            self.next_label = 0
+            self.labels = LabelTable()
         
         # Control de asistencias
         self.estudiantes_reconocidos = set()
         self.tiempos_reconocimiento = {}
         self.duracion_reconocimiento = settings.RECONOCIMIENTO_CONFIG['duracion_reconocimiento']
         
-        print(f"Modelo cargado. Personas: {self.image_paths}")
-        print(f"Label dict: {self.label_dict}, Next label: {self.next_label}")
+        # Registro de asistencias fuera del hilo de la petición. Cada
+        # asistencia es una escritura propia: todavía no se agrupan en
+        # batches de Firestore
+        self._asistencia_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # Protege modelo, etiquetas y estado de asistencias entre hilos
+        self._lock = threading.RLock()
+        # Serializa las escrituras del modelo a disco
+        self._escritura_lock = threading.Lock()
+        
+        # Detectores y buffers de detección reutilizados entre frames (uno
+        # por hilo del pool)
+        self._buffers = threading.local()
+        
+        # Trackers por sesión (se descartan tras 10 s sin frames)
+        self._trackers = TTLCache(maxsize=256, ttl=10)
+        self._trackers_lock = threading.Lock()
+        
+        logger.debug("Modelo cargado. Personas: %s", self.labels.names)
+        logger.debug("Label dict: %s, Next label: %s", self.labels.index, self.labels.next)
 
-    def decode_image(self, data_url):
+    def decode_image_gray(self, data_url):
         """
-        Decodifica una imagen base64 a numpy array
+        Decodifica una imagen base64 a numpy array en escala de grises
         
         Args:
             data_url: String con imagen en base64 (data:image/...)
             
         Returns:
-            numpy.ndarray: Imagen en formato BGR
+            numpy.ndarray: Imagen en escala de grises
+        """
+        _, _, b64 = data_url.partition(',')
+        b64 = b64 or data_url
+        img_bytes = base64.b64decode(b64, validate=False)
+        return self.decode_bytes_gray(img_bytes)
+
+    def decode_bytes_gray(self, img_bytes):
+        """
+        Decodifica los bytes crudos de una imagen (JPEG/PNG) en escala de grises
+        
+        El reconocimiento solo usa grises, así que se decodifica directamente
+        a un canal en vez de BGR + cvtColor
+        
+        Args:
+            img_bytes: Bytes de la imagen codificada
+            
+        Returns:
+            numpy.ndarray: Imagen en escala de grises
         """
-        b64 = re.sub(r'^data:image/.+;base64,', '', data_url)
-        img_bytes = base64.b64decode(b64)
         nparr = np.frombuffer(img_bytes, np.uint8)
-        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
 
-    def detectar_rostro(self, frame):
+    def detectar_rostro(self, gray):
         """
         Detecta rostros en una imagen
         
         Args:
-            frame: Imagen BGR
+            gray: Imagen en escala de grises
             
         Returns:
-            tuple: (gray_frame, faces) donde faces es lista de (x,y,w,h)
+            list: Rostros como (x,y,w,h)
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_classif.detectMultiScale(gray, 1.3, 5)
-        return gray, faces
+        if not self.usar_dnn:
+            return self._detectar_haar(gray)
+        
+        # El modelo espera 3 canales: replicar grises ya reducido a 300x300
+        h, w = gray.shape[:2]
+        small = cv2.cvtColor(cv2.resize(gray, (300, 300)), cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(small, 1.0, (300, 300), (104, 117, 123))
+        face_net = self._detector_dnn()
+        face_net.setInput(blob)
+        detections = face_net.forward()[0, 0]
+        
+        # Filas: [_, _, confianza, x1, y1, x2, y2] con coordenadas normalizadas
+        umbral = settings.RECONOCIMIENTO_CONFIG['confianza_deteccion']
+        detections = detections[detections[:, 2] > umbral]
+        
+        # Cajas cuadradas alrededor del centro (como las de Haar) para no
+        # deformar el rostro al llevarlo a 150x150
+        faces = []
+        for x1, y1, x2, y2 in detections[:, 3:7] * np.array([w, h, w, h]):
+            lado = int(min(max(x2 - x1, y2 - y1), w, h))
+            if lado <= 0:
+                continue
+            x = min(max(int((x1 + x2 - lado) / 2), 0), w - lado)
+            y = min(max(int((y1 + y2 - lado) / 2), 0), h - lado)
+            faces.append((x, y, lado, lado))
+        
+        return faces
+
+    def _detector_dnn(self):
+        """Retorna la red DNN de detección del hilo actual (la crea si no existe)"""
+        face_net = getattr(self._buffers, 'face_net', None)
+        if face_net is None:
+            face_net = cv2.dnn.readNetFromCaffe(
+                str(settings.FACE_DNN_PROTOTXT), str(settings.FACE_DNN_MODEL)
+            )
+            face_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            face_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._buffers.face_net = face_net
+        return face_net
+
+    def _clasificador_haar(self):
+        """Retorna el clasificador Haar del hilo actual (lo crea si no existe)"""
+        face_classif = getattr(self._buffers, 'face_classif', None)
+        if face_classif is None:
+            face_classif = self._buffers.face_classif = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            )
+        return face_classif
 
-    def reconocer_rostro(self, image_data):
+    def detectar_rostro_sesion(self, gray, sesion):
+        """
+        Detecta rostros reutilizando la detección previa de la sesión
+        
+        Tras una detección se sigue el rostro con un tracker KCF y solo se
+        vuelve a detectar cada 'frames_redeteccion' frames o si el tracker
+        pierde el rostro
+        
+        Args:
+            gray: Imagen en escala de grises
+            sesion: Identificador de la sesión de cámara
+            
+        Returns:
+            list: Rostros como (x,y,w,h)
+        """
+        with self._trackers_lock:
+            estado = self._trackers.get(sesion)
+            if estado is None:
+                estado = _SesionTracker()
+            # Reinsertar para renovar el TTL
+            self._trackers[sesion] = estado
+        
+        # Otro frame de la misma sesión está usando el tracker
+        if not estado.lock.acquire(blocking=False):
+            return self.detectar_rostro(gray)
+        
+        try:
+            frames_redeteccion = settings.RECONOCIMIENTO_CONFIG['frames_redeteccion']
+            if estado.tracker is not None and estado.frames < frames_redeteccion:
+                ok, (x, y, w, h) = estado.tracker.update(gray)
+                x, y = max(0, int(x)), max(0, int(y))
+                w = min(int(w), gray.shape[1] - x)
+                h = min(int(h), gray.shape[0] - y)
+                if ok and w > 0 and h > 0:
+                    estado.frames += 1
+                    return [(x, y, w, h)]
+            
+            faces = self.detectar_rostro(gray)
+            if len(faces) == 0:
+                estado.tracker = None
+            else:
+                estado.tracker = cv2.TrackerKCF_create()
+                estado.tracker.init(gray, tuple(int(v) for v in faces[0]))
+                estado.frames = 0
+            return faces
+        finally:
+            estado.lock.release()
+
+    def _detectar_haar(self, gray):
+        """
+        Detecta rostros con Haar sobre una copia reducida de la imagen
+        
+        Args:
+            gray: Imagen en escala de grises
+            
+        Returns:
+            list: Rostros (x,y,w,h) en coordenadas de la imagen original
+        """
+        h, w = gray.shape[:2]
+        tam_deteccion = settings.RECONOCIMIENTO_CONFIG['tam_deteccion']
+        scale = tam_deteccion / max(h, w) if max(h, w) > tam_deteccion else 1.0
+        shape = (round(h * scale), round(w * scale))
+        
+        # Reducir y ecualizar sobre un buffer reutilizado; 'gray' queda
+        # intacto para recortar el rostro
+        small = getattr(self._buffers, 'gray', None)
+        if small is None or small.shape != shape:
+            small = self._buffers.gray = np.empty(shape, np.uint8)
+        
+        if scale < 1.0:
+            cv2.resize(gray, (shape[1], shape[0]), dst=small, interpolation=cv2.INTER_LINEAR)
+            cv2.equalizeHist(small, small)
+        else:
+            cv2.equalizeHist(gray, small)
+        
+        faces = self._clasificador_haar().detectMultiScale(
+            small, 1.2, 3,
+            flags=cv2.CASCADE_DO_CANNY_PRUNING,
+            minSize=(30, 30)
+        )
+        
+        # Volver a escala original
+        return [tuple(int(v / scale) for v in face) for face in faces]
+
+    def reconocer_rostro(self, image_data, sesion=None):
         """
         Reconoce un rostro en una imagen base64
         
         Args:
             image_data: Imagen en base64
+            sesion: Identificador de la sesión de cámara (opcional, activa el tracking)
+            
+        Returns:
+            dict: Resultado del reconocimiento
+        """
+        gray = self.decode_image_gray(image_data)
+        return self._reconocer_frame(gray, sesion)
+
+    def reconocer_rostro_bytes(self, raw, sesion=None):
+        """
+        Reconoce un rostro en una imagen recibida como bytes (multipart)
+        
+        Args:
+            raw: Bytes de la imagen codificada
+            sesion: Identificador de la sesión de cámara (opcional, activa el tracking)
             
         Returns:
             dict: Resultado del reconocimiento
         """
-        frame = self.decode_image(image_data)
-        gray, faces = self.detectar_rostro(frame)
+        gray = self.decode_bytes_gray(raw)
+        return self._reconocer_frame(gray, sesion)
+
+    def _reconocer_frame(self, gray, sesion=None):
+        """Reconoce el primer rostro de una imagen en grises ya decodificada"""
+        if gray is None:
+            return {"estado": "error", "mensaje": "Error decodificando imagen"}
+        
+        if sesion is None:
+            faces = self.detectar_rostro(gray)
+        else:
+            faces = self.detectar_rostro_sesion(gray, sesion)
         
         if len(faces) == 0:
             return {"estado": "sin_rostro"}
@@ -103,23 +350,34 @@ class ReconocimientoService:
         # Procesar solo el primer rostro
         x, y, w, h = faces[0]
         rostro = gray[y:y+h, x:x+w]
-        rostro = cv2.resize(rostro, (150, 150), interpolation=cv2.INTER_CUBIC)
+        rostro = cv2.resize(rostro, (150, 150), interpolation=cv2.INTER_AREA)
         
-        label, confianza = self.face_recognizer.predict(rostro)
+        # update() de LBPH realoja sus histogramas: predecir bajo el lock y
+        # tomar la tabla de etiquetas que corresponde a ese modelo
+        with self._lock:
+            label, confianza = self.face_recognizer.predict(rostro)
+            names = self.labels.names
+        n = len(names)
         
         box = [int(x), int(y), int(w), int(h)]
         
-        if confianza < settings.RECONOCIMIENTO_CONFIG['confianza_threshold'] and label < len(self.image_paths):
-            nombre = self.image_paths[label]
+        if confianza < settings.RECONOCIMIENTO_CONFIG['confianza_threshold'] and label < n:
+            nombre = names[label]
             
             # Lógica de registro único con tiempo
-            if nombre not in self.tiempos_reconocimiento:
-                self.tiempos_reconocimiento[nombre] = time.time()
-            elif time.time() - self.tiempos_reconocimiento[nombre] >= self.duracion_reconocimiento:
-                if nombre not in self.estudiantes_reconocidos:
-                    self.estudiantes_reconocidos.add(nombre)
-                    # Registrar asistencia en Firebase
-                    asistencia_service.registrar_asistencia(nombre)
+            with self._lock:
+                if nombre not in self.tiempos_reconocimiento:
+                    self.tiempos_reconocimiento[nombre] = time.time()
+                elif time.time() - self.tiempos_reconocimiento[nombre] >= self.duracion_reconocimiento:
+                    if nombre not in self.estudiantes_reconocidos:
+                        self.estudiantes_reconocidos.add(nombre)
+                        # Registrar asistencia en Firebase (en segundo plano)
+                        futuro = self._asistencia_executor.submit(
+                            asistencia_service.registrar_asistencia, nombre
+                        )
+                        futuro.add_done_callback(
+                            lambda f, nombre=nombre: self._asistencia_registrada(f, nombre)
+                        )
             
             return {
                 "estado": "reconocido",
@@ -134,6 +392,21 @@ class ReconocimientoService:
                 "box": box
             }
 
+    def _asistencia_registrada(self, futuro, nombre):
+        """
+        Revisa el registro en segundo plano de una asistencia; si falló, saca
+        al estudiante de los reconocidos y reinicia su tiempo, así se reintenta
+        tras otros 'duracion_reconocimiento' segundos y no en cada frame
+        """
+        error = futuro.exception()
+        if error is None:
+            return
+        
+        logger.error("Error registrando asistencia de %s: %s", nombre, error)
+        with self._lock:
+            self.estudiantes_reconocidos.discard(nombre)
+            self.tiempos_reconocimiento[nombre] = time.time()
+
     def guardar_foto_registro(self, estudiante, foto_base64):
         """
         Guarda una foto de registro detectando y recortando el rostro
@@ -145,22 +418,43 @@ class ReconocimientoService:
         Returns:
             dict: {"ok": bool, "msg": str, "ruta": str (opcional)}
         """
-        # Sanear nombre
-        estudiante = os.path.splitext(os.path.basename(estudiante))[0]
-        person_path = os.path.join(self.data_path, estudiante)
-        os.makedirs(person_path, exist_ok=True)
-        
         # Decodificar imagen
         try:
-            header, encoded = foto_base64.split(',', 1)
-            img_bytes = base64.b64decode(encoded)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            _, _, encoded = foto_base64.partition(',')
+            encoded = encoded or foto_base64
+            img_bytes = base64.b64decode(encoded, validate=False)
+            gray = self.decode_bytes_gray(img_bytes)
         except Exception as e:
             return {"ok": False, "msg": f"Error decodificando imagen: {str(e)}"}
         
+        return self._guardar_rostro(estudiante, gray)
+
+    def guardar_foto_registro_bytes(self, estudiante, raw):
+        """
+        Guarda una foto de registro recibida como bytes (multipart)
+        
+        Args:
+            estudiante: Nombre del estudiante
+            raw: Bytes de la imagen codificada
+            
+        Returns:
+            dict: {"ok": bool, "msg": str, "ruta": str (opcional)}
+        """
+        gray = self.decode_bytes_gray(raw)
+        return self._guardar_rostro(estudiante, gray)
+
+    def _guardar_rostro(self, estudiante, gray):
+        """Detecta, recorta y guarda el primer rostro de una imagen en grises"""
+        if gray is None:
+            return {"ok": False, "msg": "Error decodificando imagen"}
+        
+        # Sanear nombre
+        estudiante = os.path.splitext(os.path.basename(estudiante))[0]
+        person_path = os.path.join(self.data_path, estudiante)
+        os.makedirs(person_path, exist_ok=True)
+        
         # Detectar rostro
-        gray, faces = self.detectar_rostro(img)
+        faces = self.detectar_rostro(gray)
         
         if len(faces) == 0:
             return {"ok": False, "msg": "no face"}
@@ -168,7 +462,7 @@ class ReconocimientoService:
         # Recortar primer rostro
         x, y, w, h = faces[0]
         rostro = gray[y:y+h, x:x+w]
-        rostro = cv2.resize(rostro, (150, 150), interpolation=cv2.INTER_CUBIC)
+        rostro = cv2.resize(rostro, (150, 150), interpolation=cv2.INTER_AREA)
         
         # Guardar
         timestamp = int(time.time() * 1000)
@@ -192,50 +486,37 @@ class ReconocimientoService:
         if not os.path.exists(person_path):
             return {"ok": False, "msg": "No existe la carpeta del estudiante"}
         
-        # Asignar etiqueta si no existe
-        if estudiante not in self.label_dict:
-            self.label_dict[estudiante] = self.next_label
-            self.image_paths.append(estudiante)
-            self.next_label += 1
-        
-        label = self.label_dict[estudiante]
-        
         # Cargar todas las fotos
+        rutas = [entry.path for entry in os.scandir(person_path) if entry.is_file()]
         faces_data = []
-        labels = []
         rutas_procesadas = []
         
-        for filename in os.listdir(person_path):
-            img_path = os.path.join(person_path, filename)
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        for img_path, img in zip(rutas, _cargar_imagenes(rutas)):
             if img is not None:
                 faces_data.append(img)
-                labels.append(label)
                 rutas_procesadas.append(img_path)
         
         if not faces_data:
             return {"ok": False, "msg": "No hay imágenes para entrenar"}
         
-        # Entrenar incrementalmente
-        try:
-            self.face_recognizer.update(faces_data, np.array(labels))
-            self.face_recognizer.write(str(self.model_path))
-        except:
-            # Si falla update (modelo vacío), usar train
-            self.face_recognizer.train(faces_data, np.array(labels))
-            self.face_recognizer.write(str(self.model_path))
-        
-        # Borrar imágenes temporales
-        for ruta in rutas_procesadas:
-            os.remove(ruta)
-        
-        # Intentar borrar carpeta si está vacía
-        try:
-            os.rmdir(person_path)
-        except:
-            pass
+        # Asignar etiqueta y entrenar en la misma sección crítica, así la
+        # etiqueta siempre es de la tabla del modelo que se actualiza
+        with self._lock:
+            label = self.labels.add(estudiante)
+            labels = np.full(len(faces_data), label, dtype=np.int32)
+            
+            # Entrenar incrementalmente
+            try:
+                self.face_recognizer.update(faces_data, labels)
+            except:
+                # Si falla update (modelo vacío), usar train
+                self.face_recognizer.train(faces_data, labels)
         
-        print(f"Entrenamiento incremental: {len(faces_data)} imágenes de {estudiante}")
+        # Guardar modelo en segundo plano; las imágenes temporales se borran
+        # solo cuando el modelo ya está en disco
+        self._persistir_modelo(rutas_procesadas, [person_path])
+        
+        logger.debug("Entrenamiento incremental: %s imágenes de %s", len(faces_data), estudiante)
         
         return {
             "ok": True,
@@ -250,52 +531,51 @@ class ReconocimientoService:
         Returns:
             dict: Resultado del entrenamiento
         """
-        print("Entrenando modelo completo...")
+        logger.debug("Entrenando modelo completo...")
         
-        # Listar personas en Data/
-        people_list = [d for d in os.listdir(self.data_path) 
-                      if os.path.isdir(os.path.join(self.data_path, d))]
+        # Listar personas en Data/ y sus archivos (DirEntry evita stat extra)
+        personas = [
+            (entry.name, [f.path for f in os.scandir(entry.path) if f.is_file()])
+            for entry in os.scandir(self.data_path) if entry.is_dir()
+        ]
+        people_list = [name_dir for name_dir, _ in personas]
         
         if not people_list:
             return {"ok": False, "msg": "No hay personas para entrenar"}
         
-        labels = []
-        faces_data = []
-        label = 0
+        # Etiquetas preasignadas por bloques, sin crecer listas en Python
+        rutas = []
+        labels = np.empty(sum(len(archivos) for _, archivos in personas), dtype=np.int32)
+        offset = 0
         
-        for name_dir in people_list:
-            person_path = os.path.join(self.data_path, name_dir)
-            
-            for filename in os.listdir(person_path):
-                img_path = os.path.join(person_path, filename)
-                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    faces_data.append(img)
-                    labels.append(label)
-            
-            label += 1
+        for label, (_, archivos) in enumerate(personas):
+            labels[offset:offset + len(archivos)] = label
+            offset += len(archivos)
+            rutas.extend(archivos)
+        
+        imgs = _cargar_imagenes(rutas)
+        validas = np.fromiter((img is not None for img in imgs), dtype=bool, count=len(imgs))
+        faces_data = [img for img in imgs if img is not None]
         
         if not faces_data:
             return {"ok": False, "msg": "No se encontraron imágenes"}
         
-        # Entrenar
-        self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.face_recognizer.train(faces_data, np.array(labels))
-        self.image_paths = people_list
-        self.label_dict = {name: idx for idx, name in enumerate(people_list)}
-        self.next_label = len(people_list)
+        labels = labels[validas]
         
-        # Guardar modelo
-        self.face_recognizer.write(str(self.model_path))
+        # Entrenar un modelo nuevo fuera del lock y reemplazar modelo y
+        # etiquetas juntos
+        face_recognizer = cv2.face.LBPHFaceRecognizer_create()
+        face_recognizer.train(faces_data, labels)
+        with self._lock:
+            self.face_recognizer = face_recognizer
+            self.labels = LabelTable(people_list)
         
-        # Borrar imágenes originales
-        for name_dir in people_list:
-            person_path = os.path.join(self.data_path, name_dir)
-            for filename in os.listdir(person_path):
-                os.remove(os.path.join(person_path, filename))
-            os.rmdir(person_path)
+        # Guardar modelo en segundo plano; las imágenes originales se borran
+        # solo cuando el modelo ya está en disco
+        carpetas = [os.path.join(self.data_path, name_dir) for name_dir in people_list]
+        self._persistir_modelo(rutas, carpetas)
         
-        print(f"Modelo entrenado con {len(faces_data)} imágenes")
+        logger.debug("Modelo entrenado con %s imágenes", len(faces_data))
         
         return {
             "ok": True,
@@ -304,6 +584,64 @@ class ReconocimientoService:
             "imagenes_totales": len(faces_data)
         }
 
+    def _persistir_modelo(self, rutas_imagenes, carpetas):
+        """
+        Escribe el modelo a disco en un hilo aparte, sin bloquear la respuesta
+        
+        Args:
+            rutas_imagenes: Imágenes de entrenamiento a borrar una vez guardado
+            carpetas: Carpetas a borrar (si quedan vacías) una vez guardado
+        """
+        # No daemon: el intérprete espera a que el modelo quede en disco
+        threading.Thread(
+            target=self._escribir_modelo, args=(rutas_imagenes, carpetas)
+        ).start()
+
+    def _escribir_modelo(self, rutas_imagenes, carpetas):
+        """
+        Escribe el modelo en un archivo temporal y lo reemplaza de forma atómica,
+        así un fallo a mitad de escritura nunca deja el modelo corrupto. Solo
+        después borra las imágenes ya incorporadas al modelo
+        """
+        tmp_path = self.model_path.with_suffix('.tmp' + self.model_path.suffix)
+        try:
+            # Una escritura a la vez; la última siempre toma el modelo más reciente
+            with self._escritura_lock:
+                # Serializar en memoria bajo el lock (rápido) y escribir a
+                # disco fuera de él, sin bloquear predict()
+                # FaceRecognizer.write en Python solo acepta un nombre de
+                # archivo; la sobrecarga con FileStorage está en Algorithm
+                with self._lock:
+                    fs = cv2.FileStorage('.xml', cv2.FILE_STORAGE_WRITE | cv2.FILE_STORAGE_MEMORY)
+                    cv2.Algorithm.write(self.face_recognizer, fs, 'opencv_lbphfaces')
+                    contenido = fs.releaseAndGetString()
+                
+                with open(tmp_path, 'w') as f:
+                    f.write(contenido)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                # Confirmar que el archivo carga antes de reemplazar el modelo
+                cv2.face.LBPHFaceRecognizer_create().read(str(tmp_path))
+                os.replace(tmp_path, self.model_path)
+        except Exception as e:
+            logger.error("Error guardando modelo: %s", e)
+            return
+        
+        # Borrar imágenes ya incorporadas al modelo
+        for ruta in rutas_imagenes:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        
+        # Intentar borrar carpetas si están vacías
+        for carpeta in carpetas:
+            try:
+                os.rmdir(carpeta)
+            except OSError:
+                pass
+
     def listar_estudiantes(self):
         """
         Retorna lista de estudiantes registrados en el modelo
@@ -311,12 +649,13 @@ class ReconocimientoService:
         Returns:
             list: Lista de nombres de estudiantes
         """
-        return self.image_paths.copy()
+        return self.labels.names.copy()
 
     def reset_reconocimientos(self):
         """Limpia el conjunto de estudiantes reconocidos (para nueva sesión)"""
-        self.estudiantes_reconocidos.clear()
-        self.tiempos_reconocimiento.clear()
+        with self._lock:
+            self.estudiantes_reconocidos.clear()
+            self.tiempos_reconocimiento.clear()
 
 
 # Singleton instance
@@ -0,0 +1,27 @@
+"""
+Renderer JSON basado en orjson
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+import orjson
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer de DRF serializando con orjson (C, libera el GIL)
+    
+    Los tipos que orjson no soporta (Decimal, lazy strings, etc.) se delegan
+    al encoder de DRF
+    """
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        
+        return orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
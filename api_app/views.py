@@ -4,32 +4,80 @@ Vistas de la API de reconocimiento facial
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from .services.reconocimiento_service import reconocimiento_service
 from .services.asistencia_service import asistencia_service
 from .permissions import verificar_token
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Pool acotado para el trabajo de OpenCV (libera el GIL) de las vistas async.
+# reconocer_rostro corre en varios hilos a la vez: el servicio usa detectores
+# por hilo y protege modelo y estado con su lock
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix='reconocimiento'
+)
+
+
+# Último chequeo exitoso de Firebase del health check
+_FB_HEALTH = {'status': None, 'ts': 0.0}
+_FB_HEALTH_TTL = 5
+
+
+def _sesion_camara(request):
+    """Identifica la sesión de cámara por usuario de Firebase e IP del cliente"""
+    uid = getattr(request, 'user_firebase', {}).get('uid', '')
+    return f"{uid}:{request.META.get('REMOTE_ADDR', '')}"
+
 
 @method_decorator(csrf_exempt, name='dispatch')
-class RegistroView(APIView):
+class RegistroView(AsyncAPIView):
     """
     Endpoint para reconocimiento facial en tiempo real
     
-    POST: Recibe imagen en base64 y retorna si reconoce a alguien
+    POST: Recibe imagen en base64 (JSON) o como archivo 'image'
+    (multipart/form-data) y retorna si reconoce a alguien
+    
+    Vista async: el reconocimiento corre en _EXECUTOR para que un worker
+    ASGI atienda varias peticiones a la vez
     """
     
-    def post(self, request):
+    async def post(self, request):
         # Verificar token
-        token_error = verificar_token(request)
+        # Sin afinidad de hilo (caché con lock propio): no serializar en el
+        # hilo compartido de sync_to_async
+        token_error = await sync_to_async(verificar_token, thread_sensitive=False)(request)
         if token_error:
             return token_error
         
+        loop = asyncio.get_running_loop()
+        sesion = _sesion_camara(request)
+        
         try:
+            # multipart/form-data: bytes JPEG crudos, sin base64
+            if request.content_type.startswith('multipart/'):
+                image_file = request.FILES.get('image')
+                
+                if not image_file:
+                    return Response(
+                        {"estado": "error", "mensaje": "No se recibió imagen"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                resultado = await loop.run_in_executor(
+                    _EXECUTOR, reconocimiento_service.reconocer_rostro_bytes, image_file.read(), sesion
+                )
+                return Response(resultado, status=status.HTTP_200_OK)
+            
             image_data = request.data.get('image')
             
             if not image_data:
@@ -38,7 +86,9 @@ class RegistroView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            resultado = reconocimiento_service.reconocer_rostro(image_data)
+            resultado = await loop.run_in_executor(
+                _EXECUTOR, reconocimiento_service.reconocer_rostro, image_data, sesion
+            )
             return Response(resultado, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -53,7 +103,8 @@ class GuardarFotoView(APIView):
     """
     Endpoint para guardar fotos durante el registro de un estudiante
     
-    POST: Recibe nombre de estudiante y foto en base64
+    POST: Recibe nombre de estudiante y foto en base64 (JSON) o como
+    archivo 'foto' (multipart/form-data)
     """
     
     def post(self, request):
@@ -64,7 +115,11 @@ class GuardarFotoView(APIView):
         
         try:
             estudiante = request.data.get('estudiante', '').strip()
-            foto = request.data.get('foto', '')
+            
+            if request.content_type.startswith('multipart/'):
+                foto = request.FILES.get('foto')
+            else:
+                foto = request.data.get('foto', '')
             
             if not estudiante or not foto:
                 return Response(
@@ -72,7 +127,10 @@ class GuardarFotoView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            resultado = reconocimiento_service.guardar_foto_registro(estudiante, foto)
+            if request.content_type.startswith('multipart/'):
+                resultado = reconocimiento_service.guardar_foto_registro_bytes(estudiante, foto.read())
+            else:
+                resultado = reconocimiento_service.guardar_foto_registro(estudiante, foto)
             
             if resultado['ok']:
                 return Response(resultado, status=status.HTTP_200_OK)
@@ -98,14 +156,21 @@ class HealthCheckView(APIView):
         
         # NO verificar token en health check
         
-        try:
-            # Verificar conexión a Firebase
-            from ..firebase_config import db
-            docs_count = len(list(db.collection("asistenciaReconocimiento").limit(1).stream()))
-            firebase_status = "✅ Conectado"
-        except Exception as e:
-            firebase_status = f"❌ Error: {str(e)}"
-            logger.error(f"❌ Firebase error: {str(e)}")
+        # Reutilizar el último chequeo exitoso de Firebase durante
+        # _FB_HEALTH_TTL segundos; los errores no se cachean y se reintenta
+        if time.monotonic() - _FB_HEALTH['ts'] < _FB_HEALTH_TTL:
+            firebase_status = _FB_HEALTH['status']
+        else:
+            try:
+                # Verificar conexión a Firebase
+                from ..firebase_config import db
+                db.collection("asistenciaReconocimiento").limit(1).get(timeout=2)
+                firebase_status = "✅ Conectado"
+                _FB_HEALTH['status'] = firebase_status
+                _FB_HEALTH['ts'] = time.monotonic()
+            except Exception as e:
+                firebase_status = f"❌ Error: {str(e)}"
+                logger.error("❌ Firebase error: %s", e)
         
         return Response({
             "status": "OK",
@@ -0,0 +1,21 @@
+"""
+ASGI config for api_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Needed for the async views (e.g. ``RegistroView``); run it with an ASGI server
+such as ``uvicorn api_project.asgi:application --loop uvloop``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+from dotenv import load_dotenv
+
+load_dotenv()
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_project.settings')
+
+application = get_asgi_application()
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'rest_framework',
+    'adrf',
     'corsheaders',
 
     # --- App del proyecto ---
@@ -98,6 +99,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'api_project.wsgi.application'
+ASGI_APPLICATION = 'api_project.asgi.application'
 
 
 # Database
@@ -111,11 +113,12 @@ DATABASES = {
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api_app.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'api_app.parsers.ORJSONParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -175,10 +178,20 @@ FIREBASE_CREDENTIALS_PATH = BASE_DIR / "CredencialesFirebase" / "asistenciaconre
 MODEL_PATH = BASE_DIR / 'backend' / 'modeloLBPHReconocimientoOpencv.xml'
 DATA_PATH = BASE_DIR / 'Data'
 
+# Detector de rostros DNN (ResNet-SSD de OpenCV). Si no existen los archivos
+# se usa el clasificador Haar. Los recortes del DNN no coinciden con los de
+# Haar: al activarlo hay que volver a registrar a los estudiantes ya
+# entrenados con Haar
+FACE_DNN_PROTOTXT = BASE_DIR / 'backend' / 'deploy.prototxt'
+FACE_DNN_MODEL = BASE_DIR / 'backend' / 'res10_300x300_ssd_iter_140000.caffemodel'
+
 # Configuración de reconocimiento facial
 RECONOCIMIENTO_CONFIG = {
     'duracion_reconocimiento': 3,
     'confianza_threshold': 70,
+    'confianza_deteccion': 0.5,
+    'tam_deteccion': 640,
+    'frames_redeteccion': 15,
     'intervalo_captura': 0.1,
     'num_fotos_registro': 100,
 }
\ No newline at end of file